@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import chromadb
+import google.generativeai as genai
+from sentence_transformers import SentenceTransformer
+from dotenv import load_dotenv
+import rag
+import citations
+import snapshot
+import index_version
+
+# Batch question answering for offline bulk workloads.
+#
+# Input JSONL:  {"id": "...", "question": "..."} per line ("id" optional, defaults to a
+#               hash of the question text so it stays stable when the file is edited)
+# Output JSONL: {"id", "question", "answer", "references", "model", "index_version"} per line
+#
+# Output doubles as the checkpoint: re-running with the same --output skips
+# questions that already have an answer, so an interrupted run can be resumed.
+
+load_dotenv()
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+MAX_RETRIES = 3
+
+
+class LocalHuggingFaceEmbedding(chromadb.EmbeddingFunction):
+    def __init__(self, model_name):
+        print(f"Loading embedding model: {model_name}...")
+        self.model = SentenceTransformer(model_name)
+
+    def __call__(self, input):
+        return self.model.encode(input).tolist()
+
+
+def load_questions(path):
+    questions = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping bad JSON on line {line_no}")
+                continue
+            if not item.get("question"):
+                print(f"Skipping line {line_no}: no question")
+                continue
+            qid = item.get("id")
+            if qid is None:
+                qid = "q_" + hashlib.sha256(item["question"].encode('utf-8')).hexdigest()[:16]
+            questions.append({"id": str(qid), "question": item["question"]})
+    return questions
+
+
+def load_done_ids(path):
+    """IDs already answered in a previous (possibly interrupted) run."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return done
+
+
+def repair_partial_line(path):
+    """Cuts off a trailing line left unfinished by a killed run, so appends start clean."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if not data or data.endswith(b"\n"):
+            return
+        keep = data.rfind(b"\n") + 1
+        print(f"Dropping incomplete last line of {path} ({len(data) - keep} bytes)")
+        f.truncate(keep)
+
+
+def open_index(embedding_fn):
+    """Opens the published index the same way the app does."""
+    active = index_version.read_active()
+    col = snapshot.load_snapshot((active or {}).get("snapshot"), embedding_fn)
+    if col is None:
+        client = chromadb.PersistentClient(path=index_version.CHROMA_DB_DIR)
+        name = active["collection"] if active else index_version.COLLECTION_NAME
+        col = client.get_collection(name=name, embedding_function=embedding_fn)
+    if active:
+        graph = citations.load_citation_graph(active["citation_graph"])
+    else:
+        graph = citations.load_citation_graph()
+    return col, graph, (active or {}).get("version")
+
+
+def generate_answer(model_name, question, context_text):
+    model = genai.GenerativeModel(model_name)
+    for attempt in range(MAX_RETRIES):
+        try:
+            return model.generate_content(rag.build_prompt(question, context_text)).text
+        except Exception as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            wait = 2 ** attempt
+            print(f"  Retrying in {wait}s after error: {e}")
+            time.sleep(wait)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of tax questions in bulk")
+    parser.add_argument("input", help="Input JSONL with one {\"id\", \"question\"} per line")
+    parser.add_argument("output", help="Output JSONL (also used as checkpoint for resuming)")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="Questions embedded and retrieved per batch")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Maximum concurrent Gemini requests")
+    parser.add_argument("--n-results", type=int, default=4, help="Documents retrieved per question")
+    args = parser.parse_args()
+
+    if not GEMINI_API_KEY:
+        print("GEMINI_API_KEY is missing in .env")
+        sys.exit(1)
+    genai.configure(api_key=GEMINI_API_KEY)
+
+    questions = load_questions(args.input)
+    # A line cut off by a killed run is dropped; that question is simply answered again
+    repair_partial_line(args.output)
+    done = load_done_ids(args.output)
+    pending = [q for q in questions if q["id"] not in done]
+    print(f"{len(questions)} questions, {len(done)} already answered, {len(pending)} to go")
+    if not pending:
+        return
+
+    embedding_fn = LocalHuggingFaceEmbedding(EMBEDDING_MODEL_NAME)
+    collection, citation_graph, version = open_index(embedding_fn)
+    model_name = rag.select_model_name()
+    print(f"Index version: {version or 'legacy'} | Model: {model_name}")
+
+    answered = 0
+    failed = 0
+    started = time.time()
+
+    with open(args.output, 'a', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in range(0, len(pending), args.batch_size):
+            batch = pending[i:i+args.batch_size]
+            texts = [q["question"] for q in batch]
+
+            # One batched encode and one batched index query per batch
+            embeddings = embedding_fn.model.encode(texts, batch_size=args.batch_size).tolist()
+            retrieved = rag.retrieve_batch(collection, citation_graph, texts,
+                                           n_results=args.n_results, query_embeddings=embeddings)
+
+            futures = {}
+            for q, results in zip(batch, retrieved):
+                context_text, references = rag.build_context(results)
+                future = pool.submit(generate_answer, model_name, q["question"], context_text)
+                futures[future] = (q, references)
+
+            # At most --concurrency requests in flight; the next batch starts once this one drains
+            for future in as_completed(futures):
+                q, references = futures[future]
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"  [!] Failed {q['id']}: {e}")
+                    continue
+
+                record = {
+                    "id": q["id"],
+                    "question": q["question"],
+                    "answer": answer,
+                    "references": [
+                        {"type": ref.get("type", "법령"), "case_name": ref.get("case_name"),
+                         "law_name": ref.get("law_name"), "doc_id": ref.get("parent_id", ref.get("doc_id"))}
+                        for ref in references
+                    ],
+                    "model": model_name,
+                    "index_version": version,
+                }
+                # Flushed per answer so an interrupted run loses nothing already paid for
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                answered += 1
+
+            print(f"Progress: {min(i + args.batch_size, len(pending))}/{len(pending)} "
+                  f"({answered} answered, {failed} failed, {time.time() - started:.0f}s)")
+
+    print(f"Done: {answered} answered, {failed} failed. Re-run to retry failures.")
+
+
+if __name__ == "__main__":
+    main()
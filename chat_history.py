@@ -0,0 +1,77 @@
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+
+# Configuration
+HISTORY_DB_PATH = "chat_history.sqlite3"
+HISTORY_RETENTION_DAYS = 30  # messages older than this are deleted when the store opens (0 = keep all)
+
+
+SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def is_valid_session_id(session_id):
+    """Session IDs are random 128-bit hex tokens (uuid4().hex)."""
+    return bool(session_id) and bool(SESSION_ID_RE.match(session_id))
+
+
+def _session_key(session_id):
+    # Only a hash is stored, so the database alone does not reveal usable IDs
+    return hashlib.sha256(session_id.encode('utf-8')).hexdigest()
+
+
+class ChatHistoryStore:
+    """Chat messages per session in a local SQLite file.
+
+    One connection is shared by all Streamlit sessions of the process, so
+    access is serialized with a lock.
+    """
+    def __init__(self, path=HISTORY_DB_PATH, retention_days=HISTORY_RETENTION_DAYS):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)")
+        if retention_days:
+            self.prune(retention_days)
+
+    def prune(self, retention_days):
+        """Deletes messages older than retention_days; returns how many were removed."""
+        cutoff = time.time() - retention_days * 86400
+        with self.lock, self.conn:
+            return self.conn.execute("DELETE FROM messages WHERE created_at < ?", (cutoff,)).rowcount
+
+    def append(self, session_id, role, content):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (_session_key(session_id), role, content, time.time()))
+
+    def recent(self, session_id, limit):
+        """Returns the last `limit` messages of a session, oldest first."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (_session_key(session_id), limit)).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def count(self, session_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?", (_session_key(session_id),)).fetchone()[0]
+
+    def clear(self, session_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM messages WHERE session_id = ?", (_session_key(session_id),))
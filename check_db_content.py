@@ -1,4 +1,5 @@
 import chromadb
+import index_version
 from chromadb.config import Settings
 import logging
 
@@ -14,7 +15,8 @@ from chromadb.utils import embedding_functions
 dummy_ef = embedding_functions.DefaultEmbeddingFunction()
 
 try:
-    collection = client.get_collection(name=COLLECTION_NAME, embedding_function=dummy_ef)
+    active = index_version.read_active()
+    collection = client.get_collection(name=active["collection"] if active else COLLECTION_NAME, embedding_function=dummy_ef)
     
     # Get all metadata
     result = collection.get(include=["metadatas"])
@@ -24,13 +26,17 @@ try:
     
     chunk_counts = {}
     
-    for m in metadatas:
-        if m and 'law_name' in m:
+    # Windowed indexes store several vectors per chunk; count each chunk once (window 0)
+    chunks = [m for m in metadatas if m and m.get('window', 0) == 0]
+    
+    for m in chunks:
+        if 'law_name' in m:
             name = m['law_name']
             law_names.add(name)
             chunk_counts[name] = chunk_counts.get(name, 0) + 1
             
-    print(f"Total documents: {len(metadatas)}")
+    print(f"Total vectors: {len(metadatas)}")
+    print(f"Total chunks: {len(chunks)}")
     print("Found Law Names:")
     for name in sorted(list(law_names)):
         print(f" - {name}: {chunk_counts[name]} chunks")
@@ -0,0 +1,151 @@
+import re
+import json
+
+# Configuration
+CITATION_GRAPH_PATH = "citation_graph.json"
+
+# "법인세법 제52조", "「소득세법 시행령」 제2조의2", "구 법인세법(2010. 12. 30. ...) 제52조",
+# "상속세 및 증여세법 제2조", "같은 법 시행령 제88조" / "동법 제3조" (resolved to the
+# most recently cited law)
+LAW_PATTERN = (
+    r"(?P<law>(?:같은\s?법|동법)(?:\s?시행령|\s?시행규칙)?"
+    # Law names containing spaces are listed explicitly; a generic "X 및 Y법" would
+    # swallow lists such as "부가가치세 및 소득세법"
+    r"|상속세\s?및\s?증여세법(?:\s?시행령|\s?시행규칙)?"
+    r"|[가-힣]+법(?:률)?(?:\s?시행령|\s?시행규칙)?)"
+)
+ARTICLE_PATTERN = r"제\s?(?P<art>\d+)\s?조(?:\s?의\s?(?P<sub>\d+))?"
+# 항/호/목 after an article ("제52조제1항") are skipped so lists keep going
+SUB_ITEM_PATTERN = r"(?:\s?제\s?\d+\s?[항호목])*"
+CITATION_RE = re.compile(
+    "「?" + LAW_PATTERN + r"」?\s*(?:\([^()]{0,80}\)\s*)?" + ARTICLE_PATTERN + SUB_ITEM_PATTERN
+)
+# Further articles of the same law: "제14조, 제15조", "제7조와 제8조", "제1조 및 제2조"
+ARTICLE_LIST_RE = re.compile(r"\s?(?:,|및|와|과|ㆍ|·)\s?" + ARTICLE_PATTERN + SUB_ITEM_PATTERN)
+# Article headings inside statute text: "제52조(부당행위계산의 부인)"
+ARTICLE_HEADING_RE = re.compile(r"제(?P<art>\d+)조(?:의(?P<sub>\d+))?\(")
+
+# Words ending in 법 that are not law names
+NON_LAW_WORDS = {"방법", "불법", "위법", "적법", "편법", "입법", "사법", "해당법", "관계법"}
+RELATIVE_LAW_RE = re.compile(r"^(같은법|동법)")
+
+
+def article_key(law, art, sub=None):
+    key = f"{law.replace(' ', '')} 제{int(art)}조"
+    if sub:
+        key += f"의{int(sub)}"
+    return key
+
+
+def extract_citations(text):
+    """Returns the (law, article) nodes cited in text, in order of first appearance."""
+    text = text or ""
+    found = []
+    last_law = None
+    for m in CITATION_RE.finditer(text):
+        law = m.group("law").replace(" ", "")
+        relative = RELATIVE_LAW_RE.match(law)
+        if relative:
+            if last_law is None:
+                continue
+            # "같은 법 시행령" -> "<law>시행령"
+            base = re.sub(r"(시행령|시행규칙)$", "", last_law)
+            law = base + law[relative.end():]
+        elif law in NON_LAW_WORDS:
+            continue
+        last_law = law
+
+        keys = [article_key(law, m.group("art"), m.group("sub"))]
+        pos = m.end()
+        while True:
+            more = ARTICLE_LIST_RE.match(text, pos)
+            if not more:
+                break
+            keys.append(article_key(law, more.group("art"), more.group("sub")))
+            pos = more.end()
+
+        for key in keys:
+            if key not in found:
+                found.append(key)
+    return found
+
+
+def extract_article_headings(text, law_name):
+    """Returns the articles of law_name whose headings appear in a statute chunk."""
+    found = []
+    for m in ARTICLE_HEADING_RE.finditer(text or ""):
+        key = article_key(law_name, m.group("art"), m.group("sub"))
+        if key not in found:
+            found.append(key)
+    return found
+
+
+class CitationGraph:
+    """Adjacency between documents and (law, article) nodes.
+
+    cites / cited_by link precedents and interpretations to the articles they
+    cite; defines / defined_in link statute chunks to the articles they contain.
+    """
+    def __init__(self, cites=None, defines=None):
+        self.cites = cites or {}
+        self.defines = defines or {}
+        self.cited_by = self._invert(self.cites)
+        self.defined_in = self._invert(self.defines)
+
+    @staticmethod
+    def _invert(adjacency):
+        inverted = {}
+        for doc_id, articles in adjacency.items():
+            for article in articles:
+                inverted.setdefault(article, []).append(doc_id)
+        return inverted
+
+    @classmethod
+    def build(cls, ids, documents, metadatas):
+        cites = {}
+        defines = {}
+        for doc_id, doc, meta in zip(ids, documents, metadatas):
+            meta = meta or {}
+            if meta.get("source") == "local":
+                articles = extract_article_headings(doc, meta.get("law_name", ""))
+                if articles:
+                    defines[doc_id] = articles
+            else:
+                articles = extract_citations(doc)
+                if articles:
+                    cites[doc_id] = articles
+        return cls(cites, defines)
+
+    def expand(self, doc_ids, limit=None):
+        """Returns documents linked to doc_ids through a shared article.
+
+        A precedent expands to the statute chunks of the articles it cites; a
+        statute chunk expands to the precedents citing its articles.
+        """
+        seen = set(doc_ids)
+        related = []
+        for doc_id in doc_ids:
+            linked = [c for a in self.cites.get(doc_id, []) for c in self.defined_in.get(a, [])]
+            linked += [p for a in self.defines.get(doc_id, []) for p in self.cited_by.get(a, [])]
+            for other in linked:
+                if other not in seen:
+                    seen.add(other)
+                    related.append(other)
+                    if limit is not None and len(related) >= limit:
+                        return related
+        return related
+
+    def save(self, path=CITATION_GRAPH_PATH):
+        # Only forward edges are stored; reverse edges are rebuilt on load
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"cites": self.cites, "defines": self.defines}, f, ensure_ascii=False)
+
+
+def load_citation_graph(path=CITATION_GRAPH_PATH):
+    """Loads the citation graph, or returns None if it has not been built."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    return CitationGraph(data.get("cites"), data.get("defines"))
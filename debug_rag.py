@@ -1,4 +1,6 @@
 import chromadb
+import index_version
+import multivector
 from chromadb.utils import embedding_functions
 from sentence_transformers import SentenceTransformer
 
@@ -20,14 +22,17 @@ EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 embedding_fn = LocalHuggingFaceEmbedding(EMBEDDING_MODEL)
 
 try:
-    collection = client.get_collection(name=COLLECTION_NAME, embedding_function=embedding_fn)
+    active = index_version.read_active()
+    collection = client.get_collection(name=active["collection"] if active else COLLECTION_NAME, embedding_function=embedding_fn)
     count = collection.count()
     query = "부가가치세법 제14조"
     with open("debug_output.txt", "w", encoding="utf-8") as f:
-        f.write(f"Total documents in DB: {count}\n")
+        f.write(f"Total vectors in DB: {count}\n")
         f.write(f"\nQuerying for: '{query}'\n")
         
-        results = collection.query(
+        # One result per parent chunk (best-matching window), with the parent text
+        results = multivector.query_max_sim(
+            collection,
             query_texts=[query],
             n_results=5
         )
@@ -41,7 +46,7 @@ try:
                 f.write(f"\n[Result {i+1}] (Distance: {dist:.4f})\n")
                 f.write(f"Source: {meta.get('filename')} | ID: {meta.get('doc_id')}\n")
                 f.write("-" * 40 + "\n")
-                f.write(doc[:1000] + "...\n") # Show first 1000 chars
+                f.write((doc or "")[:1000] + "...\n") # Show first 1000 chars
                 f.write("-" * 40 + "\n")
                 
     print("Debug output saved to debug_output.txt")
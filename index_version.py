@@ -0,0 +1,71 @@
+import os
+import json
+import time
+
+# Configuration
+CHROMA_DB_DIR = "chroma_db"
+COLLECTION_NAME = "tax_laws"
+ACTIVE_POINTER = os.path.join(CHROMA_DB_DIR, "ACTIVE.json")
+KEEP_PREVIOUS = 1  # previously published versions kept for requests still using them
+
+# ACTIVE.json describes the published index version:
+#   {"version": ..., "collection": ..., "citation_graph": ..., "snapshot": ...,
+#    "count": ..., "previous": [...], "published_at": ...}
+# "previous" lists the versions published before it (newest first, at most
+# KEEP_PREVIOUS); anything else older than "version" is safe to delete.
+# Ingestion builds everything for a new version side by side with the live one
+# and only then replaces this file, so readers never see a half-built index.
+
+
+def new_version():
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+def collection_name(version):
+    return f"{COLLECTION_NAME}_{version}"
+
+
+def citation_graph_path(version):
+    return os.path.join(CHROMA_DB_DIR, f"citation_graph_{version}.json")
+
+
+def read_active(pointer=ACTIVE_POINTER):
+    """Returns the published version info, or None before the first publish."""
+    try:
+        with open(pointer, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def active_version(pointer=ACTIVE_POINTER):
+    info = read_active(pointer)
+    return info["version"] if info else None
+
+
+def publish(info, pointer=ACTIVE_POINTER):
+    """Atomically replaces the active version pointer."""
+    old = read_active(pointer)
+    previous = old.get("previous", []) if old else []
+    if old and old["version"] != info["version"]:
+        previous = [old["version"]] + previous
+    info = {
+        **info,
+        "previous": previous[:KEEP_PREVIOUS],
+        "published_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    tmp_path = pointer + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, pointer)
+
+
+def version_of(name):
+    """Index version a collection, graph file or snapshot directory belongs to."""
+    for prefix in (COLLECTION_NAME + "_", "citation_graph_"):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+    # Snapshot directories are "<version>.<export stamp>"; graph files end in .json
+    return name.split(".")[0]
@@ -1,13 +1,20 @@
 import os
 import json
+import sys
+import shutil
+import argparse
 import chromadb
 from chromadb.utils import embedding_functions
 from sentence_transformers import SentenceTransformer
+import snapshot
+import multivector
+import citations
+import index_version
 
 # Configuration
 DATA_DIR = "data/precedents"
-CHROMA_DB_DIR = "chroma_db"
-COLLECTION_NAME = "tax_laws"
+CHROMA_DB_DIR = index_version.CHROMA_DB_DIR
+SMOKE_QUERY = "부가가치세 신고 기간"
 
 # Initialize ChromaDB
 client = chromadb.PersistentClient(path=CHROMA_DB_DIR)
@@ -22,24 +29,83 @@ class LocalHuggingFaceEmbedding(chromadb.EmbeddingFunction):
     def __call__(self, input):
         return self.model.encode(input).tolist()
 
+    @property
+    def max_tokens(self):
+        # Content tokens per input; the rest of max_seq_length goes to [CLS]/[SEP]
+        return self.model.max_seq_length - self.model.tokenizer.num_special_tokens_to_add(pair=False)
+
+    def windows(self, text):
+        return multivector.token_windows(text, self.model.tokenizer, self.max_tokens)
+
 # Using a lightweight multilingual model
 EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 embedding_fn = LocalHuggingFaceEmbedding(EMBEDDING_MODEL_NAME)
 
-# Get or Create Collection
-collection = client.get_or_create_collection(
-    name=COLLECTION_NAME,
-    embedding_function=embedding_fn
-)
+# Target collection, chosen per run in __main__ (a fresh staging collection per version)
+collection = None
 
-def ingest_precedents():
-    print("Starting ingestion...")
-    files = [f for f in os.listdir(DATA_DIR) if f.endswith('.json')]
+def upsert_windowed(ids, documents, metadatas, batch_size=100):
+    """Upserts chunks as token windows (one vector each) linked to their parent ID.
+
+    Returns (expected_windows, failed_batches) so the build can be validated.
+    """
+    total_tokens = 0
+    dropped_tokens = 0
+    total_windows = 0
+    expected_windows = 0
+    failed_batches = 0
     
-    ids = []
-    documents = []
-    metadatas = []
+    for i in range(0, len(ids), batch_size):
+        # Window 0 carries the parent text; later windows only their vector
+        head_ids, head_texts, head_documents, head_metadatas = [], [], [], []
+        tail_ids, tail_texts, tail_metadatas = [], [], []
+        
+        for doc_id, doc, meta in zip(ids[i:i+batch_size], documents[i:i+batch_size], metadatas[i:i+batch_size]):
+            windows, n_tokens = embedding_fn.windows(doc)
+            total_tokens += n_tokens
+            # What single-vector encoding used to silently truncate away
+            dropped_tokens += max(0, n_tokens - embedding_fn.max_tokens)
+            
+            for j, window in enumerate(windows):
+                window_meta = {**meta, "parent_id": doc_id, "window": j}
+                if j == 0:
+                    head_ids.append(multivector.window_id(doc_id, j))
+                    head_texts.append(window)
+                    head_documents.append(doc)
+                    head_metadatas.append(window_meta)
+                else:
+                    tail_ids.append(multivector.window_id(doc_id, j))
+                    tail_texts.append(window)
+                    tail_metadatas.append(window_meta)
+        
+        expected_windows += len(head_ids) + len(tail_ids)
+        try:
+            collection.upsert(
+                ids=head_ids,
+                embeddings=embedding_fn.model.encode(head_texts).tolist(),
+                documents=head_documents,
+                metadatas=head_metadatas
+            )
+            if tail_ids:
+                collection.upsert(
+                    ids=tail_ids,
+                    embeddings=embedding_fn.model.encode(tail_texts).tolist(),
+                    metadatas=tail_metadatas
+                )
+            total_windows += len(head_ids) + len(tail_ids)
+            if i % 1000 == 0:
+                print(f"  Upserted {i}...")
+        except Exception as e:
+            failed_batches += 1
+            print(f"Error upserting batch {i}: {e}")
     
+    print(f"  {len(ids)} chunks -> {total_windows} window vectors "
+          f"({embedding_fn.max_tokens} tokens/window)")
+    if total_tokens:
+        print(f"  Tokens previously dropped by truncation: {dropped_tokens} of {total_tokens} "
+              f"({dropped_tokens / total_tokens:.1%})")
+    return expected_windows, failed_batches
+
 def ingest_precedents():
     print("Starting ingestion...")
     files = [f for f in os.listdir(DATA_DIR) if f.endswith('.json')]
@@ -147,14 +213,12 @@ def ingest_precedents():
         
     if ids:
         print(f"Upserting {len(ids)} documents to ChromaDB...")
-        collection.upsert(
-            ids=ids,
-            documents=documents,
-            metadatas=metadatas
-        )
+        stats = upsert_windowed(ids, documents, metadatas)
         print("Ingestion complete.")
+        return stats
     else:
         print("No documents found to ingest.")
+        return 0, 0
 
 def ingest_local_files():
     print("Starting local file ingestion...")
@@ -162,7 +226,7 @@ def ingest_local_files():
     
     if not os.path.exists(LOCAL_DATA_DIR):
         print(f"Directory not found: {LOCAL_DATA_DIR}")
-        return
+        return 0, 0
 
     print("Ingesting local files...")
     
@@ -174,7 +238,7 @@ def ingest_local_files():
         files = [f for f in os.listdir("tax db") if f.lower().endswith('.pdf')]
     except FileNotFoundError:
         print("tax db directory not found")
-        return
+        return 0, 0
 
     for filename in files:
         filepath = os.path.join("tax db", filename)
@@ -282,28 +346,192 @@ def ingest_local_files():
     
     if ids:
         print(f"Upserting {len(ids)} chunks from local files...")
-        batch_size = 100  # Conservative batch size
-        for i in range(0, len(ids), batch_size):
-            try:
-                collection.upsert(
-                    ids=ids[i:i+batch_size],
-                    documents=documents[i:i+batch_size],
-                    metadatas=metadatas[i:i+batch_size]
-                )
-                if i % 1000 == 0:
-                     print(f"  Upserted {i}...")
-            except Exception as e:
-                print(f"Error upserting batch {i}: {e}")
+        stats = upsert_windowed(ids, documents, metadatas, batch_size=100)  # Conservative batch size
                 
         print("Local ingestion complete.")
+        return stats
+    return 0, 0
+
+def build_citation_graph(path):
+    print("Building citation graph...")
+    data = collection.get(include=["documents", "metadatas"])
+    
+    # Only window 0 holds the parent's text; one entry per parent
+    ids = []
+    documents = []
+    metadatas = []
+    for entry_id, doc, meta in zip(data['ids'], data['documents'], data['metadatas']):
+        meta = meta or {}
+        if meta.get("window", 0) != 0:
+            continue
+        ids.append(meta.get("parent_id", entry_id))
+        documents.append(doc)
+        metadatas.append(meta)
+    
+    graph = citations.CitationGraph.build(ids, documents, metadatas)
+    graph.save(path)
+    print(f"  {len(graph.cites)} citing documents -> {len(graph.cited_by)} cited articles")
+    print(f"  {len(graph.defines)} statute chunks -> {len(graph.defined_in)} articles")
+    linked = sum(1 for a in graph.cited_by if a in graph.defined_in)
+    print(f"  {linked} cited articles resolved to local statute chunks")
+    print(f"Saved citation graph: {path}")
+    return path
+
+def export_snapshot(version):
+    print("Exporting read-only index snapshot...")
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    
+    if not data['ids']:
+        print("Collection is empty, nothing to export.")
+        return None
+    
+    version_dir = snapshot.write_snapshot(
+        ids=data['ids'],
+        embeddings=data['embeddings'],
+        documents=data['documents'],
+        metadatas=data['metadatas'],
+        model_name=EMBEDDING_MODEL_NAME,
+        version=version
+    )
+    
+    # Re-open with full checksum verification before publishing
+    index = snapshot.SnapshotIndex(version_dir, embedding_fn, verify=True)
+    print(f"Snapshot {index.version}: {index.count()} vectors, dim {index.manifest['dim']}")
+    return version_dir
+
+def validate_collection(expected_windows, failed_batches):
+    count = collection.count()
+    print(f"Validating staging collection: {count} vectors (expected {expected_windows})")
+    if failed_batches:
+        print(f"  {failed_batches} batches failed to upsert")
+        return False
+    if count == 0:
+        print("  Staging collection is empty")
+        return False
+    if count != expected_windows:
+        print("  Vector count does not match the windows written")
+        return False
+    
+    results = multivector.query_max_sim(collection, query_texts=[SMOKE_QUERY], n_results=1)
+    if not results['ids'] or not results['ids'][0]:
+        print(f"  Smoke query returned nothing: {SMOKE_QUERY}")
+        return False
+    print(f"  Smoke query OK: {SMOKE_QUERY} -> {results['ids'][0][0]}")
+    
+    # A chunk queried with its own text must come back among the top hits
+    probe = collection.get(where={"window": 0}, limit=1, include=["documents", "metadatas"])
+    probe_id = probe['metadatas'][0]["parent_id"]
+    results = multivector.query_max_sim(collection, query_texts=[probe['documents'][0]], n_results=3)
+    if probe_id not in results['ids'][0]:
+        print(f"  Known chunk {probe_id} not found by its own text")
+        return False
+    print(f"  Known chunk query OK: {probe_id}")
+    return True
+
+def prune_old_versions(active):
+    """Drops collections, graphs and snapshots of versions no longer needed.
+    
+    Keeps the active version and the versions it lists as previously
+    published; unpublished leftovers of crashed runs are removed too.
+    Versions newer than the active one may still be building and are left alone.
+    """
+    current = active["version"]
+    keep = {current, *active.get("previous", [])}
+    
+    def stale(version):
+        return version < current and version not in keep
+    
+    prefix = index_version.COLLECTION_NAME + "_"
+    # Chroma >= 0.6 lists names, older versions list Collection objects
+    names = [c if isinstance(c, str) else c.name for c in client.list_collections()]
+    for name in names:
+        if name.startswith(prefix) and stale(index_version.version_of(name)):
+            print(f"Removing old index collection {name}")
+            try:
+                client.delete_collection(name=name)
+            except Exception as e:
+                print(f"  Error deleting collection: {e}")
+    
+    for name in os.listdir(CHROMA_DB_DIR):
+        if name.startswith("citation_graph_") and stale(index_version.version_of(name)):
+            os.remove(os.path.join(CHROMA_DB_DIR, name))
+    
+    if os.path.isdir(snapshot.SNAPSHOT_DIR):
+        for name in os.listdir(snapshot.SNAPSHOT_DIR):
+            path = os.path.join(snapshot.SNAPSHOT_DIR, name)
+            if not os.path.isdir(path):
+                continue
+            version = index_version.version_of(name)
+            # Older exports of the active version are superseded by its current snapshot
+            superseded = version == current and path != active.get("snapshot")
+            if name.startswith(snapshot.TMP_PREFIX) or stale(version) or superseded:
+                print(f"Removing snapshot {name}")
+                shutil.rmtree(path)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest tax law data into ChromaDB")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="Export a read-only index snapshot after ingestion")
+    parser.add_argument("--snapshot-only", action="store_true",
+                        help="Skip ingestion and only export the snapshot of the active version")
+    args = parser.parse_args()
+    
+    if args.snapshot_only:
+        active = index_version.read_active()
+        if active is None:
+            print("No published index version. Run ingest.py first.")
+            sys.exit(1)
+        collection = client.get_collection(name=active["collection"], embedding_function=embedding_fn)
+        snapshot_dir = export_snapshot(active["version"])
+        if snapshot_dir:
+            index_version.publish({**active, "snapshot": snapshot_dir})
+            print(f"Published snapshot: {snapshot_dir}")
+            prune_old_versions(index_version.read_active())
+        sys.exit(0)
+    
+    # Build the new version next to the live one; the app keeps serving the old one
+    version = index_version.new_version()
+    collection = client.create_collection(
+        name=index_version.collection_name(version),
+        embedding_function=embedding_fn
+    )
+    print(f"Building index version {version} in staging collection {collection.name}...")
+    
     # Ensure data dir exists
     if not os.path.exists(DATA_DIR):
         print(f"Data directory {DATA_DIR} not found. Run fetch_laws.py first.")
     
     # 1. Ingest API Precedents
-    ingest_precedents()
+    precedent_windows, precedent_failures = ingest_precedents()
     
     # 2. Ingest Local Tax Laws
-    ingest_local_files()
+    local_windows, local_failures = ingest_local_files()
+    
+    # 3. Link precedents to the statute articles they cite
+    graph_path = build_citation_graph(index_version.citation_graph_path(version))
+    
+    # 4. Validate before anything points at the new version
+    if not validate_collection(precedent_windows + local_windows, precedent_failures + local_failures):
+        print("Validation failed; the live index was left untouched.")
+        client.delete_collection(name=collection.name)
+        if os.path.exists(graph_path):
+            os.remove(graph_path)
+        sys.exit(1)
+    
+    info = {
+        "version": version,
+        "collection": collection.name,
+        "citation_graph": graph_path,
+        "count": collection.count(),
+        "model": EMBEDDING_MODEL_NAME
+    }
+    
+    # 5. Export read-only snapshot for the app
+    if args.snapshot:
+        info["snapshot"] = export_snapshot(version)
+    
+    # 6. Atomic switch; running apps pick the new version up on their next request
+    index_version.publish(info)
+    print(f"Published index version {version}")
+    
+    prune_old_versions(index_version.read_active())
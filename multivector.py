@@ -0,0 +1,106 @@
+# Multi-vector retrieval: each chunk is embedded as several token windows that
+# together cover all of its text. Window entries carry "parent_id" / "window"
+# in their metadata; only window 0 stores the parent's document text.
+
+WINDOW_OVERLAP = 16   # tokens shared by neighbouring windows
+QUERY_OVERFETCH = 4   # windows fetched per requested parent (first attempt)
+
+
+def window_id(parent_id, index):
+    return f"{parent_id}#w{index}"
+
+
+def token_windows(text, tokenizer, max_tokens, overlap=WINDOW_OVERLAP):
+    """Splits text into windows of at most max_tokens tokens covering all of it.
+
+    Returns (windows, n_tokens) where n_tokens is the untruncated token count.
+    """
+    enc = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                    truncation=False, verbose=False)
+    offsets = enc["offset_mapping"]
+    n_tokens = len(offsets)
+    if n_tokens <= max_tokens:
+        return [text], n_tokens
+
+    windows = []
+    step = max(1, max_tokens - overlap)
+    start = 0
+    while True:
+        end = min(start + max_tokens, n_tokens)
+        windows.append(text[offsets[start][0]:offsets[end - 1][1]])
+        if end == n_tokens:
+            break
+        start += step
+    return windows, n_tokens
+
+
+def _best_per_parent(raw, q, n_results):
+    ids, documents, metadatas, distances = [], [], [], []
+    seen = set()
+    # Hits come back sorted by distance, so the first window seen is the max-sim one
+    for i, entry_id in enumerate(raw["ids"][q]):
+        meta = raw["metadatas"][q][i] or {}
+        parent_id = meta.get("parent_id", entry_id)
+        if parent_id in seen:
+            continue
+        seen.add(parent_id)
+        ids.append(parent_id)
+        documents.append(raw["documents"][q][i] if raw["documents"] else None)
+        metadatas.append(meta)
+        distances.append(raw["distances"][q][i])
+        if len(ids) == n_results:
+            break
+    return {"ids": ids, "documents": documents, "metadatas": metadatas, "distances": distances}
+
+
+def query_max_sim(collection, query_texts=None, n_results=4, overfetch=QUERY_OVERFETCH,
+                  query_embeddings=None):
+    """Queries window vectors and keeps the best-scoring window per parent chunk.
+
+    Works on Chroma collections and snapshots alike; entries without a
+    parent_id (single-vector indexes) are their own parent. Pass
+    query_embeddings instead of query_texts when they are already encoded.
+    Queries that collect fewer than n_results parents are retried with twice
+    as many windows until they do or the collection runs out.
+    """
+    queries = query_embeddings if query_embeddings is not None else query_texts
+    per_query = [None] * len(queries)
+    pending = list(range(len(queries)))
+    fetch = n_results * overfetch
+
+    while pending:
+        subset = [queries[q] for q in pending]
+        if query_embeddings is not None:
+            raw = collection.query(query_embeddings=subset, n_results=fetch)
+        else:
+            raw = collection.query(query_texts=subset, n_results=fetch)
+
+        retry = []
+        for j, q in enumerate(pending):
+            best = _best_per_parent(raw, j, n_results)
+            exhausted = len(raw["ids"][j]) < fetch
+            if len(best["ids"]) < n_results and not exhausted:
+                retry.append(q)
+            else:
+                per_query[q] = best
+        pending = retry
+        fetch *= 2
+
+    # Parent text lives on window 0 only; fetch it for hits on later windows
+    missing = sorted({window_id(pid, 0) for best in per_query
+                      for pid, doc, meta in zip(best["ids"], best["documents"], best["metadatas"])
+                      if not doc and "parent_id" in meta})
+    parent_text = {}
+    if missing:
+        fetched = collection.get(ids=missing)
+        for entry_id, doc in zip(fetched["ids"], fetched["documents"]):
+            parent_text[entry_id] = doc
+
+    results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+    for best in per_query:
+        for i, pid in enumerate(best["ids"]):
+            if not best["documents"][i] and "parent_id" in best["metadatas"][i]:
+                best["documents"][i] = parent_text.get(window_id(pid, 0), "")
+        for key in results:
+            results[key].append(best[key])
+    return results
@@ -0,0 +1,93 @@
+import google.generativeai as genai
+import multivector
+
+# Shared retrieval / prompting steps of the chat app, warm-up and batch jobs
+
+
+def retrieve(collection, citation_graph, query, n_results=4, n_related=2):
+    """Vector search plus documents linked to the hits through cited articles."""
+    return retrieve_batch(collection, citation_graph, [query], n_results, n_related)[0]
+
+
+def retrieve_batch(collection, citation_graph, queries, n_results=4, n_related=2, query_embeddings=None):
+    """retrieve() for many queries with one vector query and one linked-document fetch."""
+    results = multivector.query_max_sim(collection, query_texts=queries, n_results=n_results,
+                                        query_embeddings=query_embeddings)
+
+    related = []
+    if citation_graph:
+        related = [citation_graph.expand(ids, limit=n_related) for ids in results['ids']]
+
+    linked = {}
+    wanted = sorted({multivector.window_id(r, 0) for rel in related for r in rel})
+    if wanted:
+        fetched = collection.get(ids=wanted)
+        for entry_id, doc, meta in zip(fetched['ids'], fetched['documents'], fetched['metadatas']):
+            linked[entry_id] = (doc, meta)
+
+    batch = []
+    for q in range(len(results['ids'])):
+        documents = list(results['documents'][q])
+        metadatas = list(results['metadatas'][q])
+        for r in (related[q] if related else []):
+            hit = linked.get(multivector.window_id(r, 0))
+            if hit:
+                documents.append(hit[0])
+                metadatas.append(hit[1])
+        batch.append({'documents': [documents], 'metadatas': [metadatas]})
+    return batch
+
+
+def build_context(results):
+    """Formats retrieval results for the LLM; returns (context_text, references)."""
+    context_text = ""
+    references = []
+    if results['documents']:
+        for i, doc in enumerate(results['documents'][0]):
+            meta = results['metadatas'][0][i]
+            # Format context for LLM
+            context_text += f"[Document {i+1}]\nTitle: {meta.get('case_name')}\nContent: {doc}\n\n"
+            references.append(meta)
+    return context_text, references
+
+
+def select_model_name():
+    """Dynamic model selection: Flash -> Pro -> Default."""
+    available_models = []
+    try:
+        for m in genai.list_models():
+            if 'generateContent' in m.supported_generation_methods:
+                available_models.append(m.name)
+    except Exception as e:
+        available_models = []
+
+    model_name = "gemini-1.5-flash" # Fallback
+    for m in available_models:
+        if "flash" in m:
+            model_name = m
+            break
+        elif "pro" in m and "1.5" in m:
+            model_name = m
+
+    # Clean up model name (remove 'models/' prefix if present for the client, though library handles both)
+    if model_name.startswith("models/"):
+        model_name = model_name.replace("models/", "")
+    return model_name
+
+
+def build_prompt(question, context_text):
+    system_prompt = f"""
+    당신은 한국의 유능한 세무 전문 AI 변호사입니다.
+    사용자의 질문에 대해 아래 제공된 [참고 자료]를 바탕으로 정확하고 상세하게 답변하세요.
+    
+    [답변 가이드]
+    1. **근거 중심**: 반드시 아래 제공된 법령이나 판례를 인용하여 답변하세요.
+    2. **구조화**: 답변은 읽기 편하게 불렛 포인트나 번호를 매겨 정리하세요.
+    3. **출처 표기**: 답변 중간중간에 (참고: 법인세법 제XX조) 처럼 출처를 명시하세요.
+    4. 관련 자료가 없으면 솔직하게 "제공된 데이터베이스 내에서 관련 내용을 찾을 수 없습니다."라고 말하고 일반적인 지식을 덧붙이세요.
+    
+    [참고 자료]
+    {context_text}
+    """
+
+    return f"{system_prompt}\n\n사용자 질문: {question}"
@@ -0,0 +1,132 @@
+import hashlib
+import threading
+import unicodedata
+
+
+def normalize_prompt(text):
+    """Normalizes a question so trivially different spellings share a key.
+
+    Only Unicode form and whitespace are normalized; callers run the shared
+    work on this text, so it must not change what is being asked.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+def make_key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.finished = False
+        self.result = None
+        self.error = None
+
+
+class _Stream:
+    """Chunks produced once and replayed to every subscriber as they arrive."""
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.done = False
+        self.error = None
+
+    def publish(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def close(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def subscribe(self):
+        pos = 0
+        while True:
+            with self.cond:
+                while pos >= len(self.chunks) and not self.done:
+                    self.cond.wait()
+                pending = self.chunks[pos:]
+                pos = len(self.chunks)
+                done, error = self.done, self.error
+            yield from pending
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one in-flight execution.
+
+    Results are not cached: once a call finishes, the next caller with the
+    same key starts a new one.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+
+    def do(self, key, fn):
+        """Runs fn once per key among concurrent callers and shares the result."""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+
+            if leader:
+                try:
+                    call.result = fn()
+                    call.finished = True
+                except Exception as e:
+                    call.error = e
+                    call.finished = True
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+            else:
+                call.done.wait()
+
+            # Leader was interrupted (e.g. a Streamlit rerun), so try again
+            if not call.finished:
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def stream(self, key, fn):
+        """Iterates the chunks of fn() once per key, fanned out to all callers.
+
+        fn runs on a background thread so one caller going away does not
+        stall the others.
+        """
+        with self._lock:
+            flight = self._streams.get(key)
+            if flight is None:
+                flight = _Stream()
+                self._streams[key] = flight
+                threading.Thread(target=self._produce, args=(key, flight, fn), daemon=True).start()
+        return flight.subscribe()
+
+    def _produce(self, key, flight, fn):
+        error = None
+        try:
+            for chunk in fn():
+                flight.publish(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                del self._streams[key]
+            flight.close(error)
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+
+# Configuration
+SNAPSHOT_DIR = "index_snapshot"
+SNAPSHOT_FORMAT = 1
+TMP_PREFIX = ".tmp-"
+
+# Layout of one snapshot directory (all files are read-only once written):
+#   manifest.json  -> format, version, count, dim, model, sha256/size per file
+#   vectors.f32    -> float32 [count, dim], row-major, memory mapped at load
+#   norms.f32      -> float32 [count], squared L2 norm of each vector
+#   <name>.bin     -> UTF-8 strings concatenated back to back
+#   <name>.idx     -> int64 [count + 1] byte offsets into <name>.bin
+# Strings are ids, documents and metadatas (one JSON object per record).
+BLOB_FIELDS = ("ids", "documents", "metadatas")
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_blob(dir_path, name, strings):
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    with open(os.path.join(dir_path, f"{name}.bin"), 'wb') as f:
+        for i, s in enumerate(strings):
+            data = s.encode('utf-8')
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    offsets.tofile(os.path.join(dir_path, f"{name}.idx"))
+
+
+def _snapshot_files():
+    names = ["vectors.f32", "norms.f32"]
+    for field in BLOB_FIELDS:
+        names += [f"{field}.bin", f"{field}.idx"]
+    return names
+
+
+def write_snapshot(ids, embeddings, documents, metadatas, model_name, version=None, out_dir=SNAPSHOT_DIR):
+    """Writes a new versioned snapshot under out_dir and returns its directory."""
+    vectors = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+    if vectors.ndim != 2 or vectors.shape[0] != len(ids):
+        raise ValueError(f"Embeddings shape {vectors.shape} does not match {len(ids)} ids")
+
+    # Every export gets its own directory ("<version>.<stamp>"), so exporting the
+    # same index version again never collides and changes the published path
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    name = f"{version}.{time.strftime('%Y%m%d-%H%M%S')}"
+    suffix = 0
+    while os.path.exists(os.path.join(out_dir, name)):
+        suffix += 1
+        name = f"{version}.{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+    final_dir = os.path.join(out_dir, name)
+
+    # Written under a temporary name and renamed into place when complete;
+    # leftovers of a crashed export are simply overwritten
+    version_dir = os.path.join(out_dir, TMP_PREFIX + name)
+    if os.path.isdir(version_dir):
+        shutil.rmtree(version_dir)
+    os.makedirs(version_dir)
+
+    vectors.tofile(os.path.join(version_dir, "vectors.f32"))
+    np.einsum('ij,ij->i', vectors, vectors).astype(np.float32).tofile(
+        os.path.join(version_dir, "norms.f32"))
+    _write_blob(version_dir, "ids", [str(x) for x in ids])
+    _write_blob(version_dir, "documents", [d or "" for d in documents])
+    _write_blob(version_dir, "metadatas",
+                [json.dumps(m or {}, ensure_ascii=False) for m in metadatas])
+
+    files = {}
+    for name in _snapshot_files():
+        path = os.path.join(version_dir, name)
+        files[name] = {"size": os.path.getsize(path), "sha256": _sha256(path)}
+        os.chmod(path, 0o444)
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "snapshot": name,
+        "count": int(vectors.shape[0]),
+        "dim": int(vectors.shape[1]),
+        "model": model_name,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": files,
+    }
+    with open(os.path.join(version_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    os.chmod(os.path.join(version_dir, "manifest.json"), 0o444)
+
+    os.rename(version_dir, final_dir)
+    return final_dir
+
+
+class _StringTable:
+    """Memory-mapped view over a <name>.bin / <name>.idx pair."""
+    def __init__(self, dir_path, name):
+        self.offsets = np.memmap(os.path.join(dir_path, f"{name}.idx"), dtype=np.int64, mode='r')
+        blob_path = os.path.join(dir_path, f"{name}.bin")
+        # np.memmap refuses zero-length files
+        if os.path.getsize(blob_path):
+            self.blob = np.memmap(blob_path, dtype=np.uint8, mode='r')
+        else:
+            self.blob = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+
+class SnapshotIndex:
+    """Read-only index over a snapshot, queried like a Chroma collection."""
+    def __init__(self, dir_path, embedding_function, verify=False):
+        with open(os.path.join(dir_path, "manifest.json"), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format: {self.manifest.get('format')}")
+        for name, info in self.manifest["files"].items():
+            path = os.path.join(dir_path, name)
+            if os.path.getsize(path) != info["size"]:
+                raise ValueError(f"Snapshot file {name} has unexpected size")
+            if verify and _sha256(path) != info["sha256"]:
+                raise ValueError(f"Snapshot file {name} failed checksum")
+
+        self.path = dir_path
+        self.version = self.manifest["version"]
+        self.embedding_function = embedding_function
+        count, dim = self.manifest["count"], self.manifest["dim"]
+        if count:
+            self.vectors = np.memmap(os.path.join(dir_path, "vectors.f32"),
+                                     dtype=np.float32, mode='r', shape=(count, dim))
+            self.norms = np.memmap(os.path.join(dir_path, "norms.f32"),
+                                   dtype=np.float32, mode='r', shape=(count,))
+        else:
+            self.vectors = np.zeros((0, dim), dtype=np.float32)
+            self.norms = np.zeros(0, dtype=np.float32)
+        self.ids = _StringTable(dir_path, "ids")
+        self.documents = _StringTable(dir_path, "documents")
+        self.metadatas = _StringTable(dir_path, "metadatas")
+
+    def count(self):
+        return self.manifest["count"]
+
+    def get(self, ids):
+        # id -> row map is only built on first lookup
+        if not hasattr(self, "_rows"):
+            self._rows = {self.ids[i]: i for i in range(len(self.ids))}
+        rows = [self._rows[i] for i in ids if i in self._rows]
+        return {
+            "ids": [self.ids[i] for i in rows],
+            "documents": [self.documents[i] for i in rows],
+            "metadatas": [json.loads(self.metadatas[i]) for i in rows],
+        }
+
+    def query(self, query_texts=None, n_results=10, query_embeddings=None):
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        k = min(n_results, self.count())
+
+        # Squared L2, same space as the Chroma collection; one matmul for the whole batch
+        all_dists = (self.norms[None, :] - 2.0 * (queries @ self.vectors.T)
+                     + np.einsum('ij,ij->i', queries, queries)[:, None])
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for dists in all_dists:
+            if k < len(dists):
+                top = np.argpartition(dists, k)[:k]
+            else:
+                top = np.arange(len(dists))
+            top = top[np.argsort(dists[top])]
+
+            results["ids"].append([self.ids[i] for i in top])
+            results["documents"].append([self.documents[i] for i in top])
+            results["metadatas"].append([json.loads(self.metadatas[i]) for i in top])
+            results["distances"].append([float(dists[i]) for i in top])
+        return results
+
+
+def load_snapshot(path, embedding_function, verify=False):
+    """Opens a snapshot directory read-only, or returns None if it does not exist."""
+    if not path or not os.path.isdir(path):
+        return None
+    return SnapshotIndex(path, embedding_function, verify=verify)
@@ -4,7 +4,15 @@ from chromadb.utils import embedding_functions
 from sentence_transformers import SentenceTransformer
 import google.generativeai as genai
 import os
+import uuid
 from dotenv import load_dotenv
+import snapshot
+import singleflight
+import citations
+import index_version
+import chat_history
+import rag
+import warmup
 
 # Compatibility fix for Streamlit Cloud (Linux) + ChromaDB
 try:
@@ -18,8 +26,8 @@ except ImportError:
 # Load params
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-CHROMA_DB_DIR = "chroma_db"
-COLLECTION_NAME = "tax_laws"
+CHROMA_DB_DIR = index_version.CHROMA_DB_DIR
+COLLECTION_NAME = index_version.COLLECTION_NAME
 
 # Page Config with proper title and layout
 st.set_page_config(
@@ -56,19 +64,75 @@ with col2:
     st.title("AI Tax Accountant")
     st.caption("국세청 판례, 예규 및 세무 법령 기반 지능형 챗봇 (Powered by Gemini)")
 
+# Chat History (SQLite-backed; only a recent window is kept in memory and rendered)
+HISTORY_WINDOW = 20  # messages rendered per rerun
+HISTORY_PAGE = 20    # older messages loaded per click
+
+# Old conversations are pruned when the store opens (CHAT_HISTORY_RETENTION_DAYS, 0 = keep all)
+@st.cache_resource
+def get_history_store():
+    retention_days = int(os.getenv("CHAT_HISTORY_RETENTION_DAYS", chat_history.HISTORY_RETENTION_DAYS))
+    return chat_history.ChatHistoryStore(retention_days=retention_days)
+
+history_store = get_history_store()
+
+# Restoring history from the URL is opt-in (CHAT_HISTORY_URL_RESTORE=1). The "sid"
+# parameter is then a bearer secret: anyone holding the link can read that chat,
+# so only enable it where links are not shared (e.g. a single-user deployment).
+# By default every browser session gets a fresh ID that only appears in the
+# sidebar as a restore code, so a user can pick a chat up again after a reload.
+HISTORY_URL_RESTORE = os.getenv("CHAT_HISTORY_URL_RESTORE", "0") == "1"
+
+if "session_id" not in st.session_state:
+    url_sid = st.query_params.get("sid") if HISTORY_URL_RESTORE else None
+    st.session_state.session_id = url_sid if chat_history.is_valid_session_id(url_sid) else uuid.uuid4().hex
+    if HISTORY_URL_RESTORE:
+        st.query_params["sid"] = st.session_state.session_id
+session_id = st.session_state.session_id
+
+def add_message(role, content):
+    history_store.append(session_id, role, content)
+    st.session_state.messages.append({"role": role, "content": content})
+    # Back to the default window after paging, then keep memory bounded; older turns stay in SQLite
+    st.session_state.history_limit = HISTORY_WINDOW
+    del st.session_state.messages[:-st.session_state.history_limit]
+
 # Sidebar for Settings & References
 with st.sidebar:
     st.header("⚙️ Settings")
     if st.button("🗑️ 대화 기록 지우기"):
+        history_store.clear(session_id)
         st.session_state.messages = []
+        st.session_state.history_limit = HISTORY_WINDOW
         st.rerun()
     
+    # Restore code = this session's ID; kept by the user, never put in the URL by default
+    with st.expander("🔑 대화 복원"):
+        st.caption("이 코드를 보관하면 새로고침 후에도 대화를 이어갈 수 있습니다. 다른 사람과 공유하지 마세요.")
+        st.code(session_id, language=None)
+        restore_code = st.text_input("복원 코드 입력", key="restore_code").strip().lower()
+        if st.button("대화 불러오기"):
+            if not chat_history.is_valid_session_id(restore_code):
+                st.error("올바르지 않은 복원 코드입니다.")
+            elif not history_store.count(restore_code):
+                st.warning("해당 코드로 저장된 대화가 없습니다.")
+            else:
+                st.session_state.session_id = restore_code
+                if HISTORY_URL_RESTORE:
+                    st.query_params["sid"] = restore_code
+                # Reloaded from SQLite on the next run
+                st.session_state.pop("messages", None)
+                st.rerun()
+    
     st.markdown("---")
     st.markdown("### 📚 Data Sources")
     st.caption("- main taxlaw.pdf (Internal Law)")
     st.caption("- National Law API (Precedents)")
     st.markdown("---")
-    st.info("💡 질문 예시:\n- 부가가치세 신고 기간은?\n- 법인세 손금산입 요건은?\n- 업무무관가지급금이란?")
+    st.markdown("💡 질문 예시:")
+    for example in warmup.load_questions():
+        if st.button(example, key=f"example_{example}"):
+            st.session_state.pending_prompt = example
 
 if not GEMINI_API_KEY:
     st.error("❌ GEMINI_API_KEY is missing in .env")
@@ -79,8 +143,7 @@ genai.configure(api_key=GEMINI_API_KEY)
 
 # Initialize Resources (Cached)
 @st.cache_resource
-def get_chroma_collection():
-    client = chromadb.PersistentClient(path=CHROMA_DB_DIR)
+def get_embedding_function():
     model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     
     class LocalHuggingFaceEmbedding(chromadb.EmbeddingFunction):
@@ -89,22 +152,80 @@ def get_chroma_collection():
         def __call__(self, input):
             return self.model.encode(input).tolist()
             
-    embedding_fn = LocalHuggingFaceEmbedding(model_name)
+    return LocalHuggingFaceEmbedding(model_name)
+
+# Keyed by index version and snapshot path (a snapshot can be published for an
+# existing version); max_entries=1 drops the old handle once either changes
+@st.cache_resource(max_entries=1)
+def get_chroma_collection(version, snapshot_path, _active):
+    embedding_fn = get_embedding_function()
+    
+    # Prefer the prebuilt read-only snapshot (memory mapped, shared via OS page cache)
+    try:
+        col = snapshot.load_snapshot(snapshot_path, embedding_fn)
+        if col is not None:
+            return col
+    except Exception as e:
+        print(f"Snapshot load failed, falling back to ChromaDB: {e}")
     
     try:
-        col = client.get_collection(name=COLLECTION_NAME, embedding_function=embedding_fn)
+        client = chromadb.PersistentClient(path=CHROMA_DB_DIR)
+        name = _active["collection"] if _active else COLLECTION_NAME
+        col = client.get_collection(name=name, embedding_function=embedding_fn)
     except Exception:
         col = None
     return col
 
-collection = get_chroma_collection()
+# Process-wide, shared by every session (module globals are reset on each rerun)
+@st.cache_resource
+def get_single_flight():
+    return singleflight.SingleFlight()
+
+@st.cache_resource(max_entries=1)
+def get_citation_graph(version, _active):
+    if _active:
+        return citations.load_citation_graph(_active["citation_graph"])
+    return citations.load_citation_graph()
+
+# Re-read on every rerun so a published rebuild is picked up by the next request
+active_index = index_version.read_active()
+index_key = active_index["version"] if active_index else None
+
+collection = get_chroma_collection(index_key, (active_index or {}).get("snapshot"), active_index)
+flights = get_single_flight()
+citation_graph = get_citation_graph(index_key, active_index)
+
+# Model list rarely changes; avoid a list_models round trip per question
+@st.cache_resource(ttl=3600)
+def get_model_name():
+    return rag.select_model_name()
+
+model_name = get_model_name()
+
+# Warm-up runs once per index version and precomputes answers to frequent questions;
+# the previous version's answers are served until the new warm-up finishes
+@st.cache_resource
+def get_warmup_manager():
+    return warmup.WarmupManager()
+
+answer_cache = get_warmup_manager().current(index_key, collection, citation_graph, model_name)
 
 if collection is None:
     st.warning("⚠️ No database found. Please run ingest.py locally first.")
 
 # Chat Logic
 if "messages" not in st.session_state:
-    st.session_state["messages"] = [{"role": "assistant", "content": "안녕하세요! 세무 법령 및 판례에 대해 무엇이든 물어보세요."}]
+    st.session_state.history_limit = HISTORY_WINDOW
+    st.session_state["messages"] = history_store.recent(session_id, HISTORY_WINDOW)
+    if not st.session_state.messages:
+        st.session_state["messages"] = [{"role": "assistant", "content": "안녕하세요! 세무 법령 및 판례에 대해 무엇이든 물어보세요."}]
+
+# Page in older turns on demand
+if history_store.count(session_id) > len(st.session_state.messages):
+    if st.button("⬆️ 이전 대화 더 보기"):
+        st.session_state.history_limit += HISTORY_PAGE
+        st.session_state.messages = history_store.recent(session_id, st.session_state.history_limit)
+        st.rerun()
 
 # Display Chat History
 for msg in st.session_state.messages:
@@ -113,86 +234,72 @@ for msg in st.session_state.messages:
     else:
         st.chat_message("assistant").write(msg["content"])
 
-# User Input
-if prompt := st.chat_input("질문을 입력하세요..."):
+def show_references(references):
+    # Show References in Expander (Clean UI)
+    if references:
+        with st.expander("📚 참고한 법령/판례 리스트 보기"):
+            for ref in references:
+                st.markdown(f"**[{ref.get('type', '법령')}] {ref.get('case_name')}**")
+                # st.caption(ref.get('filename')) # Optional
+
+# User Input (typed, or an example clicked in the sidebar)
+prompt = st.chat_input("질문을 입력하세요...") or st.session_state.pop("pending_prompt", None)
+if prompt:
     # 1. User Message
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    add_message("user", prompt)
     st.chat_message("user").write(prompt)
     
+    normalized_prompt = singleflight.normalize_prompt(prompt)
+    precomputed = answer_cache.get(prompt)
+    
+    # Frequent question answered during warm-up: serve it directly
+    if precomputed and precomputed["answer"]:
+        with st.chat_message("assistant"):
+            st.markdown(precomputed["answer"])
+            add_message("assistant", precomputed["answer"])
+            show_references(precomputed["references"])
+        st.stop()
+    
     # 2. RAG Retrieval
     context_text = ""
     references = []
     
-    if collection:
-        results = collection.query(
-            query_texts=[prompt],
-            n_results=4  # Increased context
+    if precomputed:
+        context_text, references = precomputed["context_text"], precomputed["references"]
+    elif collection:
+        # Concurrent identical questions share one retrieval
+        results = flights.do(
+            singleflight.make_key("retrieve", index_key, normalized_prompt),
+            lambda: rag.retrieve(collection, citation_graph, normalized_prompt, n_results=4)  # Increased context
         )
-        
-        if results['documents']:
-            for i, doc in enumerate(results['documents'][0]):
-                meta = results['metadatas'][0][i]
-                # Format context for LLM
-                context_text += f"[Document {i+1}]\nTitle: {meta.get('case_name')}\nContent: {doc}\n\n"
-                references.append(meta)
-
-    # 3. Gemini Generation (Dynamic Model Selection)
-    available_models = []
-    try:
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                available_models.append(m.name)
-    except Exception as e:
-        available_models = []
-
-    # Prefer Flash -> Pro -> Default
-    model_name = "gemini-1.5-flash" # Fallback
-    for m in available_models:
-        if "flash" in m:
-            model_name = m
-            break
-        elif "pro" in m and "1.5" in m:
-            model_name = m
-    
-    # Clean up model name (remove 'models/' prefix if present for the client, though library handles both)
-    if model_name.startswith("models/"):
-        model_name = model_name.replace("models/", "")
-        
+        context_text, references = rag.build_context(results)
+
+    # 3. Gemini Generation
     model = genai.GenerativeModel(model_name)
+    # Built from the normalized text so every session sharing the key gets the same answer
+    full_prompt = rag.build_prompt(normalized_prompt, context_text)
     
-    system_prompt = f"""
-    당신은 한국의 유능한 세무 전문 AI 변호사입니다.
-    사용자의 질문에 대해 아래 제공된 [참고 자료]를 바탕으로 정확하고 상세하게 답변하세요.
-    
-    [답변 가이드]
-    1. **근거 중심**: 반드시 아래 제공된 법령이나 판례를 인용하여 답변하세요.
-    2. **구조화**: 답변은 읽기 편하게 불렛 포인트나 번호를 매겨 정리하세요.
-    3. **출처 표기**: 답변 중간중간에 (참고: 법인세법 제XX조) 처럼 출처를 명시하세요.
-    4. 관련 자료가 없으면 솔직하게 "제공된 데이터베이스 내에서 관련 내용을 찾을 수 없습니다."라고 말하고 일반적인 지식을 덧붙이세요.
-    
-    [참고 자료]
-    {context_text}
-    """
+    # Same question + same context -> one Gemini call, streamed to every waiting session
+    generation_key = singleflight.make_key("generate", model_name, normalized_prompt, context_text)
     
-    full_prompt = f"{system_prompt}\n\n사용자 질문: {prompt}"
+    def generate():
+        for chunk in model.generate_content(full_prompt, stream=True):
+            yield chunk.text
     
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
         with st.spinner("법령 분석 및 답변 작성 중..."):
             try:
-                response = model.generate_content(full_prompt)
-                answer = response.text
+                answer = ""
+                for piece in flights.stream(generation_key, generate):
+                    answer += piece
+                    message_placeholder.markdown(answer + "▌")
                 message_placeholder.markdown(answer)
                 
                 # Append to history
-                st.session_state.messages.append({"role": "assistant", "content": answer})
+                add_message("assistant", answer)
                 
-                # Show References in Expander (Clean UI)
-                if references:
-                    with st.expander("📚 참고한 법령/판례 리스트 보기"):
-                        for ref in references:
-                            st.markdown(f"**[{ref.get('type', '법령')}] {ref.get('case_name')}**")
-                            # st.caption(ref.get('filename')) # Optional
+                show_references(references)
                     
             except Exception as e:
                 st.error(f"Error generating response: {e}")
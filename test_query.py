@@ -1,6 +1,8 @@
 import chromadb
+import index_version
 from sentence_transformers import SentenceTransformer
 import os
+import multivector
 
 # Configuration
 CHROMA_DB_DIR = "chroma_db"
@@ -18,12 +20,14 @@ class LocalHuggingFaceEmbedding(chromadb.EmbeddingFunction):
 model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 embedding_fn = LocalHuggingFaceEmbedding(model_name)
 
-collection = client.get_collection(name=COLLECTION_NAME, embedding_function=embedding_fn)
+active = index_version.read_active()
+collection = client.get_collection(name=active["collection"] if active else COLLECTION_NAME, embedding_function=embedding_fn)
 
 query = "부가가치세 신고 기간은 언제야?"
 print(f"Query: {query}")
 
-results = collection.query(
+results = multivector.query_max_sim(
+    collection,
     query_texts=[query],
     n_results=3
 )
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import threading
+import google.generativeai as genai
+import rag
+import singleflight
+
+# Configuration (environment / .env overrides, read at call time so they work
+# regardless of when load_dotenv() runs relative to this import)
+#   WARMUP_ENABLED=0   -> no warm-up at all
+#   WARMUP_GENERATE=0  -> precompute retrieval only, no Gemini calls
+#   WARMUP_QUESTIONS   -> path of the JSON question list
+DEFAULT_QUESTIONS_PATH = "warmup_questions.json"
+
+
+def _enabled(name):
+    return os.getenv(name, "1") != "0"
+
+
+DEFAULT_QUESTIONS = [
+    "부가가치세 신고 기간은?",
+    "법인세 손금산입 요건은?",
+    "업무무관가지급금이란?",
+]
+
+
+def load_questions(path=None):
+    """Curated frequent questions: a JSON list of strings, or the defaults."""
+    path = path or os.getenv("WARMUP_QUESTIONS", DEFAULT_QUESTIONS_PATH)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            questions = json.load(f)
+    except FileNotFoundError:
+        return list(DEFAULT_QUESTIONS)
+    except json.JSONDecodeError as e:
+        print(f"Bad warm-up question file {path}: {e}")
+        return list(DEFAULT_QUESTIONS)
+    return [q for q in questions if isinstance(q, str) and q.strip()]
+
+
+class AnswerCache:
+    """Precomputed retrieval results and answers for one index version."""
+    def __init__(self, version):
+        self.version = version
+        self.entries = {}
+        self.done = threading.Event()
+
+    def get(self, question):
+        return self.entries.get(singleflight.normalize_prompt(question))
+
+
+def run_warmup(cache, collection, citation_graph, questions, model_name, generate=None):
+    """Loads the embedder, touches the index and fills cache for each question."""
+    if generate is None:
+        generate = _enabled("WARMUP_GENERATE")
+    started = time.time()
+    try:
+        if collection is None:
+            return
+        # Pulls index pages (and the embedding model) in before the first user does
+        collection.count()
+
+        for question in questions:
+            # Same normalized text the live chat path retrieves and prompts with
+            question = singleflight.normalize_prompt(question)
+            try:
+                results = rag.retrieve(collection, citation_graph, question)
+                context_text, references = rag.build_context(results)
+                entry = {"results": results, "context_text": context_text,
+                         "references": references, "answer": None}
+
+                if generate:
+                    model = genai.GenerativeModel(model_name)
+                    entry["answer"] = model.generate_content(rag.build_prompt(question, context_text)).text
+
+                cache.entries[question] = entry
+            except Exception as e:
+                print(f"Warm-up failed for '{question}': {e}")
+
+        print(f"Warm-up for index {cache.version}: {len(cache.entries)}/{len(questions)} "
+              f"questions in {time.time() - started:.1f}s")
+    finally:
+        cache.done.set()
+
+
+def start_warmup(version, collection, citation_graph, model_name, questions=None):
+    """Starts warm-up on a background thread and returns its (filling) cache."""
+    cache = AnswerCache(version)
+    if not _enabled("WARMUP_ENABLED"):
+        cache.done.set()
+        return cache
+    questions = load_questions() if questions is None else questions
+    threading.Thread(
+        target=run_warmup,
+        args=(cache, collection, citation_graph, questions, model_name),
+        daemon=True
+    ).start()
+    return cache
+
+
+class WarmupManager:
+    """Hands out the answer cache to serve for the active index version.
+
+    When a new version is published its warm-up starts in the background, and
+    the previous version's cache keeps being served until the new one is done,
+    so frequent questions stay instant across a rebuild.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.serving = None
+        self.warming = None
+
+    def current(self, version, collection, citation_graph, model_name):
+        with self.lock:
+            latest = self.warming or self.serving
+            if latest is None or latest.version != version:
+                self.warming = start_warmup(version, collection, citation_graph, model_name)
+            if self.warming is not None and self.warming.done.is_set():
+                self.serving, self.warming = self.warming, None
+            return self.serving or self.warming